@@ -11,7 +11,7 @@ from aiogram.types import (
     Location,
 )
 from dotenv import load_dotenv
-import requests
+import aiohttp
 
 load_dotenv()
 BOT_TOKEN = os.environ["BOT_TOKEN"]
@@ -19,6 +19,7 @@ API_BASE = os.environ.get("API_BASE", "http://localhost:8000/api")
 AUTH_TOKEN = os.environ.get("API_AUTH_TOKEN")  # e.g. DRF token/session cookie if needed
 
 dp = Dispatcher()
+SESSION: aiohttp.ClientSession | None = None  # shared, created in main()
 
 DIRECTIONS = [
     ("Front", "front"),
@@ -35,6 +36,17 @@ WEATHER = [
     ("Snow", "snow"),
 ]
 
+# callback prefix -> (state key, label, text after "done", next keyboard)
+CHOICES = {
+    "dir": ("directions", "Directions", "Now choose desired weather.", (WEATHER, "w")),
+    "w": (
+        "weather",
+        "Weather",
+        "Great! Please share your current location so I can save bearing if EXIF lacked it (optional). Send /skip to proceed.",
+        None,
+    ),
+}
+
 user_state = {}  # demo memory: user_id -> dict
 
 
@@ -64,22 +76,25 @@ async def got_photo(m: Message, bot: Bot):
     file_id = m.photo[-1].file_id
     f = await bot.get_file(file_id)
     url = f"https://api.telegram.org/file/bot{BOT_TOKEN}/{f.file_path}"
-    # Download to backend directly
-    r = requests.get(url, timeout=30)
-    r.raise_for_status()
-    # Upload to backend
-    files = {"photo": ("spot.jpg", r.content)}
-    data = {"title": m.caption or ""}
     headers = {}
     if AUTH_TOKEN:
         headers["Authorization"] = f"Bearer {AUTH_TOKEN}"
-    resp = requests.post(
-        f"{API_BASE}/spots/", files=files, data=data, headers=headers, timeout=30
-    )
-    if resp.status_code >= 300:
-        await m.answer(f"Upload failed: {resp.text}")
-        return
-    spot = resp.json()
+    timeout = aiohttp.ClientTimeout(total=30)
+    async with SESSION.get(url, timeout=timeout) as r:
+        r.raise_for_status()
+        # buffered, not streamed: an unsized part makes aiohttp send the body
+        # chunked, and the WSGI backend reads it as empty (no Content-Length)
+        photo = await r.read()
+    form = aiohttp.FormData()
+    form.add_field("title", m.caption or "")
+    form.add_field("photo", photo, filename="spot.jpg", content_type="image/jpeg")
+    async with SESSION.post(
+        f"{API_BASE}/spots/", data=form, headers=headers, timeout=timeout
+    ) as resp:
+        if resp.status >= 300:
+            await m.answer(f"Upload failed: {await resp.text()}")
+            return
+        spot = await resp.json()
     user_state[m.from_user.id] = {
         "spot_id": spot["id"],
         "directions": set(),
@@ -91,40 +106,24 @@ async def got_photo(m: Message, bot: Bot):
     )
 
 
-@dp.callback_query(F.data.startswith("dir:"))
-async def choose_dir(cq: CallbackQuery):
-    _, val = cq.data.split(":")
-    st = user_state.setdefault(cq.from_user.id, {})
-    if val == "done":
-        await cq.message.edit_text(
-            "Now choose desired weather.", reply_markup=mkmulti(WEATHER, "w")
-        )
-        await cq.answer()
-        return
-    s = st.setdefault("directions", set())
-    if val in s:
-        s.remove(val)
-    else:
-        s.add(val)
-    await cq.answer(f"Directions: {', '.join(sorted(s)) or '(none)'}")
-
-
-@dp.callback_query(F.data.startswith("w:"))
-async def choose_weather(cq: CallbackQuery):
-    _, val = cq.data.split(":")
+@dp.callback_query(F.data.regexp(r"^(dir|w):"))
+async def choose_option(cq: CallbackQuery):
+    prefix, _, val = cq.data.partition(":")
+    key, label, next_text, next_options = CHOICES[prefix]
     st = user_state.setdefault(cq.from_user.id, {})
     if val == "done":
         await cq.message.edit_text(
-            "Great! Please share your current location so I can save bearing if EXIF lacked it (optional). Send /skip to proceed."
+            next_text,
+            reply_markup=mkmulti(*next_options) if next_options else None,
         )
         await cq.answer()
         return
-    s = st.setdefault("weather", set())
+    s = st.setdefault(key, set())
     if val in s:
         s.remove(val)
     else:
         s.add(val)
-    await cq.answer(f"Weather: {', '.join(sorted(s)) or '(none)'}")
+    await cq.answer(f"{label}: {', '.join(sorted(s)) or '(none)'}")
 
 
 @dp.message(F.location)
@@ -145,9 +144,13 @@ async def got_location(m: Message):
         "desired_directions": list(st.get("directions", [])),
         "desired_weather": list(st.get("weather", [])),
     }
-    r = requests.patch(
-        f"{API_BASE}/spots/{st['spot_id']}/", json=patch, headers=headers, timeout=15
-    )
+    async with SESSION.patch(
+        f"{API_BASE}/spots/{st['spot_id']}/",
+        json=patch,
+        headers=headers,
+        timeout=aiohttp.ClientTimeout(total=15),
+    ):
+        pass
     await m.answer(
         "Saved! Use /suggest YYYY-MM-DD to get the best time windows near you."
     )
@@ -166,9 +169,13 @@ async def skip(m: Message):
         "desired_directions": list(st.get("directions", [])),
         "desired_weather": list(st.get("weather", [])),
     }
-    r = requests.patch(
-        f"{API_BASE}/spots/{st['spot_id']}/", json=patch, headers=headers, timeout=15
-    )
+    async with SESSION.patch(
+        f"{API_BASE}/spots/{st['spot_id']}/",
+        json=patch,
+        headers=headers,
+        timeout=aiohttp.ClientTimeout(total=15),
+    ):
+        pass
     await m.answer(
         "Saved! Use /suggest YYYY-MM-DD to get time windows. I’ll need your location then."
     )
@@ -203,13 +210,16 @@ async def suggest_with_location(m: Message):
         "lat": m.location.latitude,
         "lon": m.location.longitude,
     }
-    r = requests.get(
-        f"{API_BASE}/suggestions/", params=params, headers=headers, timeout=20
-    )
-    if r.status_code >= 300:
-        await m.answer(f"Error: {r.text}")
-        return
-    data = r.json()
+    async with SESSION.get(
+        f"{API_BASE}/suggestions/",
+        params=params,
+        headers=headers,
+        timeout=aiohttp.ClientTimeout(total=20),
+    ) as r:
+        if r.status >= 300:
+            await m.answer(f"Error: {await r.text()}")
+            return
+        data = await r.json()
     if not data["count"]:
         await m.answer("No matching spots for that date & weather.")
         return
@@ -224,8 +234,15 @@ async def suggest_with_location(m: Message):
 
 
 async def main():
+    global SESSION
+    SESSION = aiohttp.ClientSession()
     bot = Bot(BOT_TOKEN)
-    await dp.start_polling(bot)
+    try:
+        # aiogram's default, made explicit: uploads rely on each update
+        # running in its own task so a slow one doesn't block others
+        await dp.start_polling(bot, handle_as_tasks=True)
+    finally:
+        await SESSION.close()
 
 
 if __name__ == "__main__":
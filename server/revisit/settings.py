@@ -129,6 +129,9 @@ STATIC_URL = "static/"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Optional on-disk weather cache shared by all workers, e.g. /var/cache/revisit/weather
+WEATHER_CACHE_DIR = env("WEATHER_CACHE_DIR", default=None)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -7,7 +7,12 @@ class SpotAdmin(admin.ModelAdmin):
     list_display = ("id", "user", "title", "created_at")
     list_filter = ("user", "created_at")
     search_fields = ("title", "description", "tags")
-    readonly_fields = ("desired_azimuth_ranges", "created_at", "updated_at")
+    readonly_fields = (
+        "desired_azimuth_ranges",
+        "created_at",
+        "updated_at",
+        "geometry_updated_at",
+    )
 
 
 @admin.register(SunWindowCache)
@@ -3,6 +3,9 @@ from django.contrib.gis.geos import Point
 from ..models import Spot
 from ..enums import SunlightDirection, WeatherPref
 
+# Large JSON columns left out of list responses (and deferred in the query)
+LIST_DEFERRED_FIELDS = ("exif", "desired_azimuth_ranges")
+
 
 class SpotSerializer(serializers.ModelSerializer):
     lat = serializers.FloatField(write_only=True, required=False)
@@ -45,3 +48,10 @@ class SpotSerializer(serializers.ModelSerializer):
     def create(self, validated):
         validated["user"] = self.context["request"].user
         return super().create(validated)
+
+
+class SpotListSerializer(SpotSerializer):
+    class Meta(SpotSerializer.Meta):
+        fields = [
+            f for f in SpotSerializer.Meta.fields if f not in LIST_DEFERRED_FIELDS
+        ]
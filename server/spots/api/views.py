@@ -2,18 +2,33 @@ from datetime import datetime, date
 from typing import List, Dict
 from django.contrib.gis.geos import Point
 from django.contrib.gis.db.models.functions import Distance
+from django.contrib.gis.measure import D
+from django.db.models import F, Prefetch
+from django.utils import timezone
 from rest_framework import viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.permissions import IsAdminUser, IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .serializers import SpotSerializer
+from .serializers import LIST_DEFERRED_FIELDS, SpotListSerializer, SpotSerializer
 from .permissions import IsOwnerOrReadOnly
+from .renderers import ORJSONRenderer
 from ..models import Spot, SunWindowCache
 from ..utils.exif import parse_exif
-from ..utils.sun import sun_windows_for_day, intersect_with_allowed_hours
-from ..utils.weather import daily_weather_category, hourly_allowed_ranges
+from ..utils.sun import (
+    sun_windows_for_day,
+    intersect_with_allowed_hours,
+    timezone_for,
+    windows_to_epochs,
+    epochs_to_json,
+)
+from ..utils.weather import (
+    daily_weather_category,
+    grid_cell,
+    hourly_weathercodes_batch,
+    allowed_ranges_from_codes,
+)
 
 
 class SpotViewSet(viewsets.ModelViewSet):
@@ -21,10 +36,24 @@ class SpotViewSet(viewsets.ModelViewSet):
     serializer_class = SpotSerializer
     permission_classes = [IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
 
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if self.action == "list":
+            # the list serializer doesn't render these, keep them out of the SELECT
+            return qs.defer(*LIST_DEFERRED_FIELDS)
+        return qs
+
+    def get_serializer_class(self):
+        if self.action == "list":
+            return SpotListSerializer
+        return super().get_serializer_class()
+
     def perform_create(self, serializer):
         spot = serializer.save(user=self.request.user)
         if spot.photo:
-            ex = parse_exif(spot.photo.path)
+            # works with remote storages, only the EXIF header is read
+            with spot.photo.open("rb") as f:
+                ex = parse_exif(f, include_raw=False)
             changed = False
             if ex.get("taken_at") and not spot.taken_at:
                 spot.taken_at = datetime.fromisoformat(ex["taken_at"])
@@ -52,6 +81,20 @@ class SpotViewSet(viewsets.ModelViewSet):
                 )
         return spot
 
+    @action(
+        detail=True, methods=["get"], url_path="raw-exif", permission_classes=[IsAdminUser]
+    )
+    def raw_exif(self, request, pk=None):
+        """
+        GET /api/spots/{id}/raw-exif/
+        Re-parses the photo and returns all EXIF tags (admin only, not stored).
+        """
+        spot = self.get_object()
+        if not spot.photo:
+            return Response({"detail": "Spot has no photo."}, status=400)
+        with spot.photo.open("rb") as f:
+            return Response(parse_exif(f, include_raw=True))
+
     @action(detail=True, methods=["get"])
     def windows(self, request, pk=None):
         """
@@ -68,8 +111,12 @@ class SpotViewSet(viewsets.ModelViewSet):
         if not spot.location:
             return Response({"detail": "Spot has no location."}, status=400)
 
-        cache = SunWindowCache.objects.filter(spot=spot, for_date=q_date).first()
-        if not cache or spot.updated_at > cache.computed_at:
+        tz = timezone_for(spot.location.y, spot.location.x)
+        # only caches computed after the last geometry change are valid
+        cache = SunWindowCache.objects.filter(
+            spot=spot, for_date=q_date, computed_at__gte=spot.geometry_updated_at
+        ).first()
+        if not cache:
             windows = sun_windows_for_day(
                 lat=spot.location.y,
                 lon=spot.location.x,
@@ -77,15 +124,18 @@ class SpotViewSet(viewsets.ModelViewSet):
                 azimuth_intervals=spot.desired_azimuth_ranges,
                 min_elevation_deg=spot.min_sun_elevation,
             )
-            as_json = [
-                {"start": w.start.isoformat(), "end": w.end.isoformat()}
-                for w in windows
-            ]
+            epochs = windows_to_epochs(windows)
             SunWindowCache.objects.update_or_create(
-                spot=spot, for_date=q_date, defaults={"windows": as_json}
+                spot=spot,
+                for_date=q_date,
+                defaults={"windows": epochs, "computed_at": timezone.now()},
+            )
+            return Response(
+                {"date": q_date.isoformat(), "windows": epochs_to_json(epochs, tz)}
             )
-            return Response({"date": q_date.isoformat(), "windows": as_json})
-        return Response({"date": q_date.isoformat(), "windows": cache.windows})
+        return Response(
+            {"date": q_date.isoformat(), "windows": epochs_to_json(cache.windows, tz)}
+        )
 
 
 class SuggestionsAPI(APIView):
@@ -96,6 +146,7 @@ class SuggestionsAPI(APIView):
     """
 
     permission_classes = [IsAuthenticatedOrReadOnly]
+    renderer_classes = [ORJSONRenderer]
 
     def get(self, request):
         try:
@@ -114,18 +165,49 @@ class SuggestionsAPI(APIView):
         user_point = Point(lon, lat, srid=4326)
 
         qs = Spot.objects.filter(user=request.user, location__isnull=False)
+        # keep fat columns (exif etc.) out of the SELECT
+        qs = qs.only(
+            "id",
+            "title",
+            "description",
+            "tags",
+            "desired_weather",
+            "desired_azimuth_ranges",
+            "min_sun_elevation",
+            "geometry_updated_at",
+            "location",
+        )
         qs = qs.annotate(distance=Distance("location", user_point)).order_by("distance")
 
-        # Optional radius clip
+        # Optional radius clip (ST_DWithin, uses the GiST index on location)
         if radius_km > 0:
-            qs = qs.filter(location__distance_lte=(user_point, radius_km * 1000))
+            qs = qs.filter(location__dwithin=(user_point, D(km=radius_km)))
 
-        results = []
-        for s in qs:
-            desired_weather = set(s.desired_weather or [])
+        # no azimuth preferences -> no sun windows, skip those spots entirely
+        qs = qs.exclude(desired_azimuth_ranges=[])
+
+        qs = qs.prefetch_related(
+            Prefetch(
+                "sun_caches",
+                # stale caches (older than the spot's geometry) aren't fetched
+                queryset=SunWindowCache.objects.filter(
+                    for_date=q_date, computed_at__gte=F("spot__geometry_updated_at")
+                ),
+                to_attr="day_caches",
+            )
+        )
+
+        spots = list(qs)
+
+        # Sun windows first: spots without any that day need no weather
+        candidates = []
+        missing_caches = []
+        for s in spots:
+            if not s.desired_azimuth_ranges:
+                continue
             # Build or read cached sun windows
-            cache = SunWindowCache.objects.filter(spot=s, for_date=q_date).first()
-            if not cache or s.updated_at > cache.computed_at:
+            cache = s.day_caches[0] if s.day_caches else None
+            if not cache:
                 windows = sun_windows_for_day(
                     lat=s.location.y,
                     lon=s.location.x,
@@ -133,45 +215,41 @@ class SuggestionsAPI(APIView):
                     azimuth_intervals=s.desired_azimuth_ranges,
                     min_elevation_deg=s.min_sun_elevation,
                 )
-                as_json = [
-                    {"start": w.start.isoformat(), "end": w.end.isoformat()}
-                    for w in windows
-                ]
-                cache, _ = SunWindowCache.objects.update_or_create(
-                    spot=s, for_date=q_date, defaults={"windows": as_json}
+                cache = SunWindowCache(
+                    spot=s, for_date=q_date, windows=windows_to_epochs(windows)
                 )
+                missing_caches.append(cache)
+
+            if cache.windows:
+                candidates.append((s, cache))
 
+        # Nearby spots share weather: one forecast per weather grid cell
+        # (~5 km), all cells fetched in a single request and filtered per
+        # spot by its categories
+        def cell(spot):
+            return grid_cell(spot.location.y, spot.location.x)
+
+        cells = list({cell(s) for s, _ in candidates if s.desired_weather})
+        hourly = dict(zip(cells, hourly_weathercodes_batch(cells, q_date)))
+
+        results = []
+        for s, cache in candidates:
+            desired_weather = set(s.desired_weather or [])
             # Hourly weather ranges (if no preference, accept entire day)
             if desired_weather:
-                allowed = hourly_allowed_ranges(
-                    s.location.y, s.location.x, q_date, desired_weather
-                )
+                times, codes = hourly[cell(s)]
+                allowed = allowed_ranges_from_codes(times, codes, desired_weather)
                 if not allowed:
                     continue  # no hours match desired weather
                 # Intersect cached windows with allowed weather hours
-                sun_windows = [
-                    (
-                        datetime.fromisoformat(w["start"]),
-                        datetime.fromisoformat(w["end"]),
-                    )
-                    for w in (cache.windows or [])
-                ]
-                from ..utils.sun import SunWindow
-
-                merged = intersect_with_allowed_hours(
-                    [SunWindow(sv[0], sv[1]) for sv in sun_windows], allowed
-                )
-                if not merged:
+                windows = intersect_with_allowed_hours(cache.windows, allowed)
+                if not windows:
                     continue
-                windows_json = [
-                    {"start": w.start.isoformat(), "end": w.end.isoformat()}
-                    for w in merged
-                ]
             else:
-                windows_json = cache.windows
-
-            if not windows_json:
-                continue
+                windows = cache.windows
+            windows_json = epochs_to_json(
+                windows, timezone_for(s.location.y, s.location.x)
+            )
 
             results.append(
                 {
@@ -186,6 +264,15 @@ class SuggestionsAPI(APIView):
                 }
             )
 
+        # One upsert for all spots whose cache was missing or stale
+        if missing_caches:
+            SunWindowCache.objects.bulk_create(
+                missing_caches,
+                update_conflicts=True,
+                unique_fields=["spot", "for_date"],
+                update_fields=["windows", "computed_at"],
+            )
+
         return Response(
             {"date": q_date.isoformat(), "count": len(results), "results": results}
         )
@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import pre_migrate
 
 
 class SpotsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "spots"
+
+    def ready(self):
+        from .sql import create_sql_functions
+
+        pre_migrate.connect(create_sql_functions, sender=self)
@@ -1,7 +1,23 @@
+from concurrent.futures import ProcessPoolExecutor
 from django.core.management.base import BaseCommand
+from django.db import connections
 from datetime import date, timedelta
 from spots.models import Spot, SunWindowCache
-from spots.utils.sun import sun_windows_for_day
+from spots.utils.sun import day_window_epochs
+
+BATCH_SIZE = 500
+
+
+def _flush(buf):
+    if buf:
+        SunWindowCache.objects.bulk_create(
+            buf,
+            batch_size=BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=["spot", "for_date"],
+            update_fields=["windows", "computed_at"],
+        )
+        buf.clear()
 
 
 class Command(BaseCommand):
@@ -10,23 +26,32 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument("--start", required=True, help="YYYY-MM-DD")
         parser.add_argument("--end", required=True, help="YYYY-MM-DD")
+        parser.add_argument(
+            "--workers", type=int, default=None, help="processes (default: CPU count)"
+        )
 
     def handle(self, *args, **opts):
         d0 = date.fromisoformat(opts["start"])
         d1 = date.fromisoformat(opts["end"])
         days = (d1 - d0).days + 1
+        spots = Spot.objects.exclude(location__isnull=True).only(
+            "id", "location", "desired_azimuth_ranges", "min_sun_elevation"
+        )
+        tasks = [
+            (s.id, s.location.y, s.location.x, s.desired_azimuth_ranges,
+             s.min_sun_elevation, d0 + timedelta(days=i))
+            for s in spots
+            for i in range(days)
+        ]
+        buf = []
         cnt = 0
-        for s in Spot.objects.exclude(location__isnull=True):
-            for i in range(days):
-                dt = d0 + timedelta(days=i)
-                windows = sun_windows_for_day(
-                    lat=s.location.y, lon=s.location.x,
-                    on_date=dt, azimuth_intervals=s.desired_azimuth_ranges,
-                    min_elevation_deg=s.min_sun_elevation
-                )
-                as_json = [{"start": w.start.isoformat(), "end": w.end.isoformat()} for w in windows]
-                SunWindowCache.objects.update_or_create(
-                    spot=s, for_date=dt, defaults={"windows": as_json}
-                )
+        # forked workers must not inherit the open database socket
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=opts["workers"]) as ex:
+            for spot_id, dt, epochs in ex.map(day_window_epochs, tasks, chunksize=32):
+                buf.append(SunWindowCache(spot_id=spot_id, for_date=dt, windows=epochs))
                 cnt += 1
+                if len(buf) >= BATCH_SIZE:
+                    _flush(buf)
+        _flush(buf)
         self.stdout.write(self.style.SUCCESS(f"Computed {cnt} spot-days"))
@@ -1,5 +1,6 @@
 from django.contrib.gis.db import models as gis
 from django.db import models
+from django.db.models import F, Func, Value
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -9,6 +10,17 @@ from .enums import SunlightDirection, WeatherPref
 
 User = get_user_model()
 
+# +/- degrees around each desired direction
+AZIMUTH_TOLERANCE_DEG = 30.0
+
+# Spot fields that sun windows are computed from
+SUN_INPUT_FIELDS = (
+    "camera_azimuth",
+    "desired_directions",
+    "location",
+    "min_sun_elevation",
+)
+
 
 def upload_to(instance, filename):
     return f"photos/{instance.user_id}/{timezone.now().date()}/{filename}"
@@ -58,12 +70,25 @@ class Spot(models.Model):
     )
 
     # Derived absolute azimuth intervals (deg, inclusive), e.g. [{"start": 70, "end": 110}, ...]
-    desired_azimuth_ranges = models.JSONField(default=list, blank=True)
+    # Computed by Postgres from camera_azimuth + desired_directions, see spots/sql.py
+    desired_azimuth_ranges = models.GeneratedField(
+        expression=Func(
+            F("camera_azimuth"),
+            F("desired_directions"),
+            Value(AZIMUTH_TOLERANCE_DEG),
+            function="spots_compute_az_ranges",
+            output_field=models.JSONField(),
+        ),
+        output_field=models.JSONField(),
+        db_persist=True,
+    )
 
     min_sun_elevation = models.FloatField(default=5.0)  # ignore very low sun
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # bumped only when inputs of sun window computation change
+    geometry_updated_at = models.DateTimeField(default=timezone.now, editable=False)
     deleted_at = models.DateTimeField(null=True, blank=True)
 
     is_featured = models.BooleanField(default=False)
@@ -76,54 +101,44 @@ class Spot(models.Model):
             models.Index(fields=["user", "created_at"]),
         ]
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._orig_geometry = self._geometry_inputs()
+
     def __str__(self):
         return self.title or f"Spot #{self.pk}"
 
-    # convert relative -> absolute azimuth ranges
-    def compute_azimuth_ranges(self, tolerance=30.0):
-        """
-        Using camera_azimuth (bearing the camera points to, 0..360),
-        expand user directions into absolute sun azimuth intervals.
-
-        FRONT: around camera_azimuth
-        SIDE_LEFT: camera_azimuth - 90
-        SIDE_RIGHT: camera_azimuth + 90
-        BACK: camera_azimuth + 180
-        """
-        if self.camera_azimuth is None or not self.desired_directions:
-            return []
-
-        base = self.camera_azimuth % 360.0
-
-        def centered_range(center):
-            start = (center - tolerance) % 360.0
-            end = (center + tolerance) % 360.0
-            return {"start": start, "end": end}
-
-        mapping = {
-            SunlightDirection.FRONT: base,
-            SunlightDirection.SIDE_LEFT: (base - 90) % 360.0,
-            SunlightDirection.SIDE_RIGHT: (base + 90) % 360.0,
-            SunlightDirection.BACK: (base + 180) % 360.0,
-        }
-        ranges = []
-        for d in self.desired_directions:
-            center = mapping.get(d, None)
-            if center is not None:
-                ranges.append(centered_range(center))
-        return ranges
+    def _geometry_inputs(self):
+        # None when loaded without these columns, i.e. they can't have changed
+        if set(SUN_INPUT_FIELDS) & self.get_deferred_fields():
+            return None
+        return (
+            self.camera_azimuth,
+            tuple(self.desired_directions or ()),
+            self.location.coords if self.location else None,
+            self.min_sun_elevation,
+        )
 
     def save(self, *args, **kwargs):
-        # refresh azimuth ranges if needed
-        if self.camera_azimuth and self.desired_directions:
-            self.desired_azimuth_ranges = self.compute_azimuth_ranges()
+        adding = self._state.adding
+        geometry = self._geometry_inputs()
+        changed = geometry is not None and geometry != self._orig_geometry
+        if changed and not adding:
+            self.geometry_updated_at = timezone.now()
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "geometry_updated_at"}
         super().save(*args, **kwargs)
+        if adding or changed:
+            # generated column: before Django 6 save() doesn't read it back
+            self.refresh_from_db(fields=["desired_azimuth_ranges"])
+        self._orig_geometry = self._geometry_inputs()
 
 
 class SunWindowCache(models.Model):
     """
     Cached sun windows for a specific spot & date (independent of weather).
-    Windows are arrays of {start, end} ISO strings in the spot's local TZ.
+    Windows are arrays of [start, end] unix timestamps (seconds).
     """
 
     spot = models.ForeignKey(Spot, on_delete=models.CASCADE, related_name="sun_caches")
@@ -132,10 +147,12 @@ class SunWindowCache(models.Model):
     computed_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = [("spot", "for_date")]
+        constraints = [
+            # also serves (spot, for_date) lookups and bulk upserts
+            models.UniqueConstraint(fields=["spot", "for_date"], name="uniq_spot_date"),
+        ]
         indexes = [
             models.Index(fields=["for_date"]),
-            models.Index(fields=["spot", "for_date"]),
         ]
 
     def __str__(self):
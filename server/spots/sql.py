@@ -0,0 +1,51 @@
+from django.db import connections
+
+# Backs Spot.desired_azimuth_ranges. Using camera_azimuth (bearing the camera
+# points to, 0..360), expand user directions into absolute sun azimuth
+# intervals of +/- tol degrees:
+#   FRONT: around camera_azimuth
+#   SIDE_LEFT: camera_azimuth - 90
+#   SIDE_RIGHT: camera_azimuth + 90
+#   BACK: camera_azimuth + 180
+# Must be IMMUTABLE to back a generated column.
+COMPUTE_AZ_RANGES = """
+CREATE OR REPLACE FUNCTION spots_compute_az_ranges(
+    cam_az double precision, dirs varchar[], tol double precision
+) RETURNS jsonb AS $$
+DECLARE
+    base double precision;
+    center double precision;
+    d varchar;
+    ranges jsonb := '[]'::jsonb;
+BEGIN
+    IF cam_az IS NULL OR dirs IS NULL THEN
+        RETURN ranges;
+    END IF;
+    base := cam_az - 360.0 * floor(cam_az / 360.0);
+    FOREACH d IN ARRAY dirs LOOP
+        center := CASE d
+            WHEN 'front' THEN base
+            WHEN 'side_left' THEN base - 90.0
+            WHEN 'side_right' THEN base + 90.0
+            WHEN 'back' THEN base + 180.0
+        END;
+        IF center IS NOT NULL THEN
+            ranges := ranges || jsonb_build_array(jsonb_build_object(
+                'start', (center - tol) - 360.0 * floor((center - tol) / 360.0),
+                'end', (center + tol) - 360.0 * floor((center + tol) / 360.0)
+            ));
+        END IF;
+    END LOOP;
+    RETURN ranges;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+"""
+
+
+def create_sql_functions(sender, using="default", **kwargs):
+    """
+    pre_migrate hook: functions referenced by generated columns
+    have to exist before the migration that adds the column.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(COMPUTE_AZ_RANGES)
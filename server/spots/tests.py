@@ -1,3 +1,489 @@
-from django.test import TestCase
+import io
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from unittest import mock
 
-# Create your tests here.
+import orjson
+import requests
+from django.test import SimpleTestCase
+from PIL import Image
+from PIL.ExifTags import GPS, IFD, Base
+from PIL.TiffImagePlugin import IFDRational
+
+from .utils.exif import parse_exif
+from .utils.sun import (
+    intersect_with_allowed_hours,
+    sun_windows_for_day,
+    windows_to_epochs,
+)
+from .utils import weather
+from .utils.weather import allowed_ranges_from_codes
+
+
+class SunWindowsTests(SimpleTestCase):
+    # Expected windows come from the astral-based implementation this one
+    # replaced, sampled on the same 5 minute grid: [[start_ts, end_ts], ...]
+    CASES = [
+        # lat, lon, date, azimuth intervals, min elevation, windows
+        (
+            50.0755, 14.4378, date(2025, 6, 21),
+            [{"start": 60, "end": 120}], 5.0,
+            [[1750477500, 1750495200]],
+        ),
+        (
+            50.0755, 14.4378, date(2025, 12, 21),
+            [{"start": 150, "end": 210}], 5.0,
+            [[1766307300, 1766322600]],
+        ),
+        (
+            -33.8688, 151.2093, date(2025, 3, 20),
+            [{"start": 250, "end": 290}, {"start": 20, "end": 70}], 5.0,
+            [[1742422800, 1742433600], [1742449800, 1742456400]],
+        ),
+        # midnight sun, interval wrapping past north
+        (
+            69.6492, 18.9553, date(2025, 6, 21),
+            [{"start": 330, "end": 30}], 1.0,
+            [[1750456800, 1750467600], [1750538100, 1750543200]],
+        ),
+    ]
+
+    def test_reference_windows(self):
+        for lat, lon, on_date, intervals, min_el, expected in self.CASES:
+            with self.subTest(lat=lat, lon=lon, on_date=on_date):
+                windows = sun_windows_for_day(lat, lon, on_date, intervals, min_el)
+                self.assertEqual(windows_to_epochs(windows), expected)
+
+    def test_polar_night(self):
+        full = [{"start": 0, "end": 360}]
+        self.assertEqual(
+            sun_windows_for_day(69.6492, 18.9553, date(2025, 12, 21), full), []
+        )
+
+    def test_no_intervals(self):
+        self.assertEqual(sun_windows_for_day(50.0, 14.0, date(2025, 6, 21), []), [])
+
+
+class IntersectWithAllowedHoursTests(SimpleTestCase):
+    def test_clips_to_allowed_ranges(self):
+        windows = [[1000, 5000], [8000, 9000]]
+        allowed = [(0, 2000), (4000, 8500)]
+        self.assertEqual(
+            intersect_with_allowed_hours(windows, allowed),
+            [[1000, 2000], [4000, 5000], [8000, 8500]],
+        )
+
+    def test_merges_pieces_closer_than_a_step(self):
+        # 5 minute sampling step: a 300 s gap is joined, 301 s is not
+        self.assertEqual(
+            intersect_with_allowed_hours([[0, 10_000]], [(0, 1000), (1300, 2000)]),
+            [[0, 2000]],
+        )
+        self.assertEqual(
+            intersect_with_allowed_hours([[0, 10_000]], [(0, 1000), (1301, 2000)]),
+            [[0, 1000], [1301, 2000]],
+        )
+
+    def test_touching_ranges_do_not_intersect(self):
+        self.assertEqual(intersect_with_allowed_hours([[0, 100]], [(100, 200)]), [])
+
+    def test_empty_inputs(self):
+        self.assertEqual(intersect_with_allowed_hours([], [(0, 100)]), [])
+        self.assertEqual(intersect_with_allowed_hours([[0, 100]], []), [])
+
+
+class AllowedRangesFromCodesTests(SimpleTestCase):
+    HOURS = [3600 * i for i in range(6)]
+
+    def test_runs_of_matching_hours(self):
+        # sunny, mostly_clear, rain, sunny, snow, sunny
+        codes = [0, 1, 61, 0, 71, 0]
+        self.assertEqual(
+            allowed_ranges_from_codes(self.HOURS, codes, {"sunny", "mostly_clear"}),
+            [(0, 7200), (10800, 14400), (18000, 21600)],
+        )
+
+    def test_last_run_extends_to_end_of_hour(self):
+        codes = [61, 61, 61, 61, 2, 2]
+        self.assertEqual(
+            allowed_ranges_from_codes(self.HOURS, codes, {"partly_cloudy"}),
+            [(14400, 21600)],
+        )
+
+    def test_no_preference_accepts_whole_day(self):
+        self.assertEqual(
+            allowed_ranges_from_codes(self.HOURS, [61] * 6, set()), [(0, 21600)]
+        )
+
+    def test_unknown_codes_count_as_cloudy(self):
+        self.assertEqual(
+            allowed_ranges_from_codes(self.HOURS[:2], [-1, 120], {"cloudy"}),
+            [(0, 7200)],
+        )
+
+    def test_null_codes_count_as_cloudy(self):
+        hours = self.HOURS[:3]
+        self.assertEqual(
+            allowed_ranges_from_codes(hours, [0, None, 0], {"sunny"}),
+            [(0, 3600), (7200, 10800)],
+        )
+        self.assertEqual(
+            allowed_ranges_from_codes(hours, [0, None, 0], {"cloudy"}), [(3600, 7200)]
+        )
+
+    def test_nothing_matches(self):
+        self.assertEqual(allowed_ranges_from_codes(self.HOURS, [61] * 6, {"sunny"}), [])
+        self.assertEqual(allowed_ranges_from_codes([], [], {"sunny"}), [])
+
+
+class _Response:
+    def __init__(self, status_code=200, payload=None, headers=None):
+        self.status_code = status_code
+        self.content = orjson.dumps(payload)
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(self.status_code)
+
+
+class _WeatherTestCase(SimpleTestCase):
+    def setUp(self):
+        weather._cache.clear()
+        weather._inflight.clear()
+        weather._validators.clear()
+        patcher = mock.patch.object(weather, "_disk_cache", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class WeatherFetchTests(_WeatherTestCase):
+    DAY = date(2025, 6, 21)
+    PAYLOAD = {
+        "hourly": {"time": [0, 3600], "weathercode": [0, 61]},
+        "daily": {"time": [0], "weathercode": [61]},
+    }
+
+    def _run_concurrently(self, respond):
+        """
+        Two threads look up the same uncached key; the upstream call is held
+        until the second one has joined the first one's in-flight fetch.
+        """
+        joined = threading.Event()
+        claim = weather._claim
+        claims = []
+
+        def counting_claim(todo):
+            out = claim(todo)
+            claims.append(out)
+            if len(claims) == 2:
+                joined.set()
+            return out
+
+        def get(*args, **kwargs):
+            self.assertTrue(joined.wait(5))
+            return respond()
+
+        results = []
+
+        def lookup():
+            try:
+                results.append(weather.hourly_weathercodes(50.0, 14.0, self.DAY, "UTC"))
+            except Exception as exc:
+                results.append(exc)
+
+        with (
+            mock.patch.object(weather, "_claim", counting_claim),
+            mock.patch.object(weather._SESSION, "get", side_effect=get) as session_get,
+        ):
+            threads = [threading.Thread(target=lookup) for _ in range(2)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join(10)
+        self.assertEqual([bool(mine) for mine, _ in claims], [True, False])
+        return session_get, results
+
+    def test_concurrent_misses_share_one_request(self):
+        session_get, results = self._run_concurrently(
+            lambda: _Response(payload=self.PAYLOAD)
+        )
+        self.assertEqual(session_get.call_count, 1)
+        self.assertEqual(results, [([0, 3600], [0, 61])] * 2)
+
+    def test_failed_fetch_fails_every_waiter(self):
+        def fail():
+            raise requests.ConnectionError("down")
+
+        session_get, results = self._run_concurrently(fail)
+        self.assertEqual(session_get.call_count, 1)
+        self.assertEqual(len(results), 2)
+        for result in results:
+            self.assertIsInstance(result, requests.ConnectionError)
+        self.assertEqual(weather._inflight, {})
+
+    def test_not_modified_reuses_previous_series(self):
+        responses = [
+            _Response(payload=self.PAYLOAD, headers={"ETag": '"v1"'}),
+            _Response(status_code=304),
+        ]
+        with mock.patch.object(
+            weather._SESSION, "get", side_effect=responses
+        ) as session_get:
+            first = weather.hourly_weathercodes(50.0, 14.0, self.DAY, "UTC")
+            weather._cache.clear()
+            second = weather.hourly_weathercodes(50.0, 14.0, self.DAY, "UTC")
+        self.assertEqual(first, second)
+        self.assertEqual(
+            session_get.call_args.kwargs["headers"], {"If-None-Match": '"v1"'}
+        )
+
+
+class WeatherCacheExpiryTests(_WeatherTestCase):
+    DAY = date(2025, 6, 21)
+
+    def setUp(self):
+        super().setUp()
+        self.now = 1000.0
+        clock = mock.patch.object(
+            weather,
+            "time",
+            mock.Mock(monotonic=lambda: self.now, time=time.time),
+        )
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def _serve(self, code):
+        payload = {"hourly": {"time": [0], "weathercode": [code]}}
+        return mock.patch.object(
+            weather._SESSION, "get", return_value=_Response(payload=payload)
+        )
+
+    def _codes(self):
+        return weather.hourly_weathercodes(50.0, 14.0, self.DAY, "UTC")[1]
+
+    def test_stale_entry_is_served_and_refreshed_once(self):
+        with self._serve(0):
+            self.assertEqual(self._codes(), [0])
+        self.now += weather.CACHE_SOFT_TTL_S + 1
+
+        with (
+            self._serve(61) as session_get,
+            mock.patch.object(weather._REFRESH_POOL, "submit") as submit,
+        ):
+            self.assertEqual(self._codes(), [0])
+            self.assertEqual(self._codes(), [0])
+            self.assertEqual(submit.call_count, 1)
+            self.assertEqual(session_get.call_count, 0)
+
+            fn, *args = submit.call_args.args
+            fn(*args)
+            self.assertEqual(session_get.call_count, 1)
+            self.assertEqual(self._codes(), [61])
+            self.assertEqual(submit.call_count, 1)
+
+    def test_expired_entry_is_fetched_in_the_foreground(self):
+        with self._serve(0):
+            self._codes()
+        self.now += weather.CACHE_HARD_TTL_S + 1
+
+        with (
+            self._serve(61) as session_get,
+            mock.patch.object(weather._REFRESH_POOL, "submit") as submit,
+        ):
+            self.assertEqual(self._codes(), [61])
+        self.assertEqual(session_get.call_count, 1)
+        submit.assert_not_called()
+
+
+    def test_validators_expire_with_the_cache(self):
+        payload = {"hourly": {"time": [0], "weathercode": [0]}}
+        response = _Response(payload=payload, headers={"ETag": '"v1"'})
+        next_day = self.DAY + timedelta(days=1)
+        with mock.patch.object(
+            weather._SESSION, "get", return_value=response
+        ) as session_get:
+            weather.hourly_weathercodes(50.0, 14.0, next_day, "UTC")
+            self._codes()
+            self.now += weather.CACHE_HARD_TTL_S + 1
+            self._codes()
+        self.assertEqual(session_get.call_args.kwargs["headers"], {})
+        # storing the new one dropped the expired validator of the other day
+        self.assertEqual(len(weather._validators), 1)
+
+
+class _DiskStub(dict):
+    """Stands in for diskcache.Cache: get/set with an ignored expire."""
+
+    def set(self, key, value, expire=None):
+        self[key] = value
+
+
+class WeatherDiskCacheTests(_WeatherTestCase):
+    KEY = ("day", 50.0, 14.0, "2025-06-21", "2025-06-21", "UTC")
+    SOFT, HARD = weather.CACHE_SOFT_TTL_S, weather.CACHE_HARD_TTL_S
+
+    def setUp(self):
+        super().setUp()
+        self.disk = _DiskStub()
+        disk = mock.patch.object(weather, "_disk_cache", return_value=self.disk)
+        disk.start()
+        self.addCleanup(disk.stop)
+        # monotonic clocks are per process, wall-clock time is shared
+        self.mono, self.wall = 0.0, 1_750_000_000.0
+        clock = mock.patch.object(
+            weather,
+            "time",
+            mock.Mock(monotonic=lambda: self.mono, time=lambda: self.wall),
+        )
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def _other_process(self, seconds_later):
+        weather._cache.clear()
+        self.mono = 5_000_000.0  # unrelated monotonic origin
+        self.wall += seconds_later
+
+    def test_entry_written_elsewhere_is_fresh_then_stale(self):
+        weather._cache_put(self.KEY, "value")
+        self._other_process(self.SOFT - 10)
+        self.assertEqual(weather._cache_get(self.KEY), ("value", True))
+        # now served from memory, with expiries converted to this clock:
+        # 10 s of freshness were left
+        self.disk.clear()
+        self.mono += 5
+        self.assertEqual(weather._cache_get(self.KEY), ("value", True))
+        self.mono += 10
+        self.assertEqual(weather._cache_get(self.KEY), ("value", False))
+        self.mono += self.HARD
+        self.assertEqual(weather._cache_get(self.KEY), (weather._MISS, False))
+
+    def test_entry_past_soft_ttl_is_stale(self):
+        weather._cache_put(self.KEY, "value")
+        self._other_process(self.SOFT + 10)
+        self.assertEqual(weather._cache_get(self.KEY), ("value", False))
+
+    def test_entry_past_hard_ttl_is_a_miss(self):
+        weather._cache_put(self.KEY, "value")
+        self._other_process(self.HARD + 10)
+        self.assertEqual(weather._cache_get(self.KEY), (weather._MISS, False))
+
+
+class DailyWeatherWindowTests(_WeatherTestCase):
+    # daily code by weekday, so every date has a known, distinct category
+    CODES = [0, 2, 61, 71, 3, 45, 1]
+
+    def _serve_daily(self, utc_offset_seconds=0):
+        """Fake Open-Meteo daily response for the requested date range."""
+
+        def get(url, params=None, **kwargs):
+            start = date.fromisoformat(params["start_date"])
+            end = date.fromisoformat(params["end_date"])
+            days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+            # unixtime daily stamps are the local midnights
+            times = [
+                int(datetime(d.year, d.month, d.day, tzinfo=timezone.utc).timestamp())
+                - utc_offset_seconds
+                for d in days
+            ]
+            return _Response(
+                payload={
+                    "utc_offset_seconds": utc_offset_seconds,
+                    "daily": {
+                        "time": times,
+                        "weathercode": [self.CODES[d.weekday()] for d in days],
+                    },
+                }
+            )
+
+        return mock.patch.object(weather._SESSION, "get", side_effect=get)
+
+    def _expected(self, on_date):
+        return weather.code_to_category(self.CODES[on_date.weekday()])
+
+    def test_days_of_one_week_share_a_request(self):
+        monday = date(2025, 6, 16)
+        days = [monday, monday + timedelta(days=2), monday + timedelta(days=6)]
+        with self._serve_daily() as session_get:
+            for day in days:
+                self.assertEqual(
+                    weather.daily_weather_category(50.0, 14.0, day, "UTC"),
+                    self._expected(day),
+                )
+        self.assertEqual(session_get.call_count, 1)
+        params = session_get.call_args.kwargs["params"]
+        self.assertEqual(params["start_date"], "2025-06-16")
+        self.assertEqual(params["end_date"], "2025-06-22")
+
+    def test_window_is_clamped_to_the_forecast_horizon(self):
+        horizon = date.today() + timedelta(days=14)
+        for day in (horizon, horizon + timedelta(days=1)):
+            with self.subTest(day=day), self._serve_daily() as session_get:
+                self.assertEqual(
+                    weather.daily_weather_category(50.0, 14.0, day, "UTC"),
+                    self._expected(day),
+                )
+                params = session_get.call_args.kwargs["params"]
+                self.assertEqual(params["end_date"], day.isoformat())
+
+    def test_utc_offset_maps_to_local_dates(self):
+        # local midnights fall on the previous UTC day east of Greenwich
+        start, end = date(2025, 1, 1), date(2025, 1, 7)
+        expected = {
+            start + timedelta(days=i): self._expected(start + timedelta(days=i))
+            for i in range(7)
+        }
+        for lat, lon, tz, offset in [
+            (21.31, -157.86, "Pacific/Honolulu", -10 * 3600),
+            (-33.87, 151.21, "Australia/Sydney", 11 * 3600),
+        ]:
+            with self.subTest(tz=tz), self._serve_daily(utc_offset_seconds=offset):
+                self.assertEqual(
+                    weather.daily_weather_categories_range(lat, lon, start, end, tz),
+                    expected,
+                )
+
+
+class ParseExifTests(SimpleTestCase):
+    GPS_TAGS = {
+        GPS.GPSLatitudeRef: "S",
+        GPS.GPSLatitude: (IFDRational(33), IFDRational(52), IFDRational(768, 100)),
+        GPS.GPSLongitudeRef: "W",
+        GPS.GPSLongitude: (IFDRational(70), IFDRational(39), IFDRational(0)),
+        GPS.GPSImgDirectionRef: "T",
+        GPS.GPSImgDirection: IFDRational(3505, 10),
+    }
+
+    def _jpeg(self, exif_ifd=None, gps=None):
+        exif = Image.Exif()
+        if exif_ifd:
+            exif[IFD.Exif] = exif_ifd
+        if gps:
+            exif[IFD.GPSInfo] = gps
+        buf = io.BytesIO()
+        Image.new("RGB", (8, 8)).save(buf, "JPEG", exif=exif)
+        buf.seek(0)
+        return buf
+
+    def test_gps_direction_and_time(self):
+        fp = self._jpeg({Base.DateTimeOriginal: "2024:05:01 18:30:00"}, self.GPS_TAGS)
+        out = parse_exif(fp)
+        self.assertEqual(out["taken_at"], "2024-05-01T18:30:00")
+        self.assertAlmostEqual(out["lat"], -(33 + 52 / 60 + 7.68 / 3600))
+        self.assertAlmostEqual(out["lon"], -(70 + 39 / 60))
+        self.assertAlmostEqual(out["img_direction"], 350.5)
+        self.assertEqual(out["img_direction_ref"], "T")
+        self.assertNotIn("raw", out)
+
+    def test_include_raw(self):
+        fp = self._jpeg({Base.DateTimeOriginal: "2024:05:01 18:30:00"}, self.GPS_TAGS)
+        raw = parse_exif(fp, include_raw=True)["raw"]
+        self.assertEqual(raw["EXIF DateTimeOriginal"], "2024:05:01 18:30:00")
+        self.assertEqual(raw["GPS GPSLatitudeRef"], "S")
+
+    def test_no_exif(self):
+        self.assertEqual(parse_exif(self._jpeg()), {})
+
+    def test_not_an_image(self):
+        self.assertEqual(parse_exif(io.BytesIO(b"not an image")), {})
@@ -1,79 +1,86 @@
 from typing import Any, Dict, Optional, Tuple
-from PIL import Image
+from PIL import Image, UnidentifiedImageError
+from PIL.ExifTags import GPS, GPSTAGS, IFD, TAGS, Base
 import pillow_heif  # enables HEIC in Pillow
-import exifread
 from datetime import datetime
-from fractions import Fraction
 
 # Ensure HEIF opener is registered
 pillow_heif.register_heif_opener()
 
 
-def _to_deg(value):
+def _to_deg(value) -> float:
     """
-    Convert exifread GPSTags like [deg, min, sec] rationals to float degrees.
+    Convert EXIF GPS [deg, min, sec] rationals to float degrees.
     """
-    d, m, s = value.values
+    d, m, s = (float(x) for x in value)
+    return d + m / 60.0 + s / 3600.0
 
-    def f(x):
-        if isinstance(x, Fraction):
-            return float(x)
-        return float(x.num) / float(x.den) if hasattr(x, "num") else float(x)
 
-    return f(d) + f(m) / 60.0 + f(s) / 3600.0
-
-
-def parse_exif(fp) -> Dict[str, Any]:
+def parse_exif(fp, include_raw: bool = False) -> Dict[str, Any]:
     """
     Extract taken_at, GPS lat/lon, GPSImgDirection if available.
-    Returns dict with keys: taken_at, lat, lon, img_direction, img_direction_ref, raw
+    fp is a path or a binary file-like object (e.g. FieldFile.open("rb")).
+    Returns dict with keys: taken_at, lat, lon, img_direction, img_direction_ref,
+    plus raw (all tags stringified) when include_raw is set.
+
+    Only the EXIF block is read (APP1 segment for JPEG), pixels are never decoded.
     """
-    with open(fp, "rb") as f:
-        tags = exifread.process_file(f, details=False)
+    try:
+        img = Image.open(fp)
+    except UnidentifiedImageError:
+        return {}  # not an image Pillow knows, so no EXIF either
+    with img:
+        exif = img.getexif()
+        exif_ifd = exif.get_ifd(IFD.Exif)
+        gps = exif.get_ifd(IFD.GPSInfo)
 
-    out: Dict[str, Any] = {"raw": {}}
-    out["raw"] = {k: str(v) for k, v in tags.items()}
+    out: Dict[str, Any] = {}
+    if include_raw:
+        out["raw"] = {
+            **{f"Image {TAGS.get(k, k)}": str(v) for k, v in exif.items()},
+            **{f"EXIF {TAGS.get(k, k)}": str(v) for k, v in exif_ifd.items()},
+            **{f"GPS {GPSTAGS.get(k, k)}": str(v) for k, v in gps.items()},
+        }
 
     # Time
-    dt = tags.get("EXIF DateTimeOriginal") or tags.get("EXIF DateTimeDigitized")
+    dt = exif_ifd.get(Base.DateTimeOriginal) or exif_ifd.get(Base.DateTimeDigitized)
     if dt:
         # EXIF has no TZ by default; you can store offsets in newer specs, but many files lack it.
         # We'll parse naive and let the app localize later.
         try:
             out["taken_at"] = datetime.strptime(
-                str(dt), "%Y:%m:%d %H:%M:%S"
+                str(dt).strip("\x00 "), "%Y:%m:%d %H:%M:%S"
             ).isoformat()
         except Exception:
             pass
 
     # GPS position
-    lat_tag = tags.get("GPS GPSLatitude")
-    lat_ref = tags.get("GPS GPSLatitudeRef")
-    lon_tag = tags.get("GPS GPSLongitude")
-    lon_ref = tags.get("GPS GPSLongitudeRef")
+    lat_tag = gps.get(GPS.GPSLatitude)
+    lat_ref = gps.get(GPS.GPSLatitudeRef)
+    lon_tag = gps.get(GPS.GPSLongitude)
+    lon_ref = gps.get(GPS.GPSLongitudeRef)
     if lat_tag and lat_ref and lon_tag and lon_ref:
-        lat = _to_deg(lat_tag)
-        lon = _to_deg(lon_tag)
-        if str(lat_ref).upper() == "S":
-            lat = -lat
-        if str(lon_ref).upper() == "W":
-            lon = -lon
-        out["lat"], out["lon"] = lat, lon
+        try:
+            lat = _to_deg(lat_tag)
+            lon = _to_deg(lon_tag)
+        except Exception:
+            pass
+        else:
+            if str(lat_ref).upper().startswith("S"):
+                lat = -lat
+            if str(lon_ref).upper().startswith("W"):
+                lon = -lon
+            out["lat"], out["lon"] = lat, lon
 
     # Camera azimuth (bearing). iPhone stores in GPSImgDirection (+ Ref = 'T' or 'M').
     # See: GPSImgDirection EXIF tag.
-    img_dir = tags.get("GPS GPSImgDirection")
-    img_dir_ref = tags.get("GPS GPSImgDirectionRef")
-    if img_dir:
+    img_dir = gps.get(GPS.GPSImgDirection)
+    img_dir_ref = gps.get(GPS.GPSImgDirectionRef)
+    if img_dir is not None:
         try:
-            out["img_direction"] = float(
-                Fraction(str(img_dir))
-            )  # often rational like '350/1'
+            out["img_direction"] = float(img_dir)  # rational like 350/1
         except Exception:
-            try:
-                out["img_direction"] = float(str(img_dir))
-            except Exception:
-                pass
+            pass
     if img_dir_ref:
         out["img_direction_ref"] = str(img_dir_ref)[0].upper()
 
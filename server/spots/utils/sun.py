@@ -1,12 +1,16 @@
+import functools
 from dataclasses import dataclass
 from datetime import datetime, timedelta, date, time
 from typing import List, Dict, Tuple
-from astral import sun as asun
+import numpy as np
 from timezonefinder import TimezoneFinder
 import pytz
 
 MIN_STEP_MINUTES = 5
 
+# loading the timezone polygons is expensive, do it once per process
+_TF = TimezoneFinder(in_memory=True)
+
 
 @dataclass
 class SunWindow:
@@ -14,23 +18,107 @@ class SunWindow:
     end: datetime
 
 
-def _wrap_contains(interval: Dict[str, float], angle: float) -> bool:
-    s = interval["start"] % 360.0
-    e = interval["end"] % 360.0
-    a = angle % 360.0
-    return (s <= e and s <= a <= e) or (s > e and (a >= s or a <= e))
-
-
-def _timezone_for(lat: float, lon: float):
-    tzname = TimezoneFinder().timezone_at(lat=lat, lng=lon) or "UTC"
-    return pytz.timezone(tzname)
-
-
-def _sun_angles(dt: datetime, lat: float, lon: float) -> Tuple[float, float]:
-    # astral.sun.azimuth/elevation expect aware dt
-    az = float(asun.azimuth((lat, lon), dt))
-    el = float(asun.elevation((lat, lon), dt))
-    return az, el
+def _flat_intervals(
+    intervals: List[Dict[str, float]],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Split azimuth intervals into non-wrapping (start, end) pairs,
+    e.g. 330..30 -> 330..360 and 0..30.
+    """
+    flat = []
+    for iv in intervals:
+        s = iv["start"] % 360.0
+        e = iv["end"] % 360.0
+        if s <= e:
+            flat.append((s, e))
+        else:
+            flat.append((s, 360.0))
+            flat.append((0.0, e))
+    starts = np.array([p[0] for p in flat])
+    ends = np.array([p[1] for p in flat])
+    return starts, ends
+
+
+@functools.lru_cache(maxsize=4096)
+def _tz_cached(lat_r: float, lon_r: float):
+    return pytz.timezone(_TF.timezone_at(lat=lat_r, lng=lon_r) or "UTC")
+
+
+def timezone_for(lat: float, lon: float):
+    # ~1 km grid is well within any timezone polygon
+    return _tz_cached(round(lat, 2), round(lon, 2))
+
+
+def _refraction(el: np.ndarray) -> np.ndarray:
+    # NOAA atmospheric refraction approximation, degrees
+    te = np.tan(np.radians(np.clip(el, -89.0, 89.0)))
+    corr = np.select(
+        [el > 85.0, el > 5.0, el > -0.575],
+        [
+            0.0,
+            58.1 / te - 0.07 / te**3 + 0.000086 / te**5,
+            1735.0 + el * (-518.2 + el * (103.4 + el * (-12.79 + el * 0.711))),
+        ],
+        default=-20.774 / te,
+    )
+    return corr / 3600.0
+
+
+def _sun_angles(
+    epoch_s: np.ndarray, lat: float, lon: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized solar azimuth/elevation (deg) for UTC epoch seconds,
+    using the NOAA solar position equations (same model as astral).
+    """
+    jc = (epoch_s / 86400.0 + 2440587.5 - 2451545.0) / 36525.0
+
+    l0 = np.radians((280.46646 + jc * (36000.76983 + 0.0003032 * jc)) % 360.0)
+    m = np.radians(357.52911 + jc * (35999.05029 - 0.0001537 * jc))
+    ecc = 0.016708634 - jc * (0.000042037 + 0.0000001267 * jc)
+    eq_ctr = (
+        np.sin(m) * (1.914602 - jc * (0.004817 + 0.000014 * jc))
+        + np.sin(2 * m) * (0.019993 - 0.000101 * jc)
+        + np.sin(3 * m) * 0.000289
+    )
+    omega = np.radians(125.04 - 1934.136 * jc)
+    app_long = np.radians(
+        np.degrees(l0) + eq_ctr - 0.00569 - 0.00478 * np.sin(omega)
+    )
+    mean_obliq = 23.0 + (
+        26.0 + (21.448 - jc * (46.815 + jc * (0.00059 - jc * 0.001813))) / 60.0
+    ) / 60.0
+    obliq = np.radians(mean_obliq + 0.00256 * np.cos(omega))
+
+    sin_delta = np.sin(obliq) * np.sin(app_long)
+    cos_delta = np.sqrt(1.0 - sin_delta**2)
+
+    y = np.tan(obliq / 2.0) ** 2
+    eq_time = 4.0 * np.degrees(
+        y * np.sin(2 * l0)
+        - 2 * ecc * np.sin(m)
+        + 4 * ecc * y * np.sin(m) * np.cos(2 * l0)
+        - 0.5 * y * y * np.sin(4 * l0)
+        - 1.25 * ecc * ecc * np.sin(2 * m)
+    )
+
+    utc_minutes = (epoch_s % 86400.0) / 60.0
+    true_solar = (utc_minutes + eq_time + 4.0 * lon) % 1440.0
+    tau = np.radians(true_solar / 4.0 - 180.0)  # hour angle
+    sin_tau, cos_tau = np.sin(tau), np.cos(tau)
+    phi_lat = np.radians(lat)
+    sin_lambda, cos_lambda = np.sin(phi_lat), np.cos(phi_lat)
+
+    sin_mu = np.clip(
+        cos_tau * cos_delta * cos_lambda + sin_delta * sin_lambda, -1.0, 1.0
+    )
+    # sin/cos of azimuth share the 1/cos(mu) factor, which atan2 cancels
+    sin_phi = -sin_tau * cos_delta
+    cos_phi = sin_delta * cos_lambda - cos_tau * cos_delta * sin_lambda
+    az = np.degrees(np.arctan2(sin_phi, cos_phi)) % 360.0
+
+    el = np.degrees(np.arcsin(sin_mu))
+    return az, el + _refraction(el)
 
 
 def sun_windows_for_day(
@@ -43,27 +131,27 @@ def sun_windows_for_day(
 ) -> List[SunWindow]:
     if not azimuth_intervals:
         return []
-    tz = _timezone_for(lat, lon)
+    tz = timezone_for(lat, lon)
     start = tz.localize(datetime.combine(on_date, time(0, 0)))
     end = start + timedelta(days=1)
-    step = timedelta(minutes=step_minutes)
 
-    cur_on, cur_start = False, None
+    # sample minutes from local midnight, inclusive of the end of day
+    t = np.arange(0, 24 * 60 + 1, step_minutes)
+    az, el = _sun_angles(start.timestamp() + t * 60.0, lat, lon)
+    starts, ends = _flat_intervals(azimuth_intervals)
+    az_mask = ((az[:, None] >= starts) & (az[:, None] <= ends)).any(axis=1)
+    good = (el >= min_elevation_deg) & az_mask
+
+    # window edges: +1 where a run starts, -1 one past where it ends
+    edges = np.diff(np.concatenate(([0], good.astype(np.int8), [0])))
+    run_starts = np.flatnonzero(edges == 1)
+    run_stops = np.flatnonzero(edges == -1)
+
     windows: List[SunWindow] = []
-    t = start
-    while t <= end:
-        az, el = _sun_angles(t, lat, lon)
-        good = el >= min_elevation_deg and any(
-            _wrap_contains(iv, az) for iv in azimuth_intervals
-        )
-        if good and not cur_on:
-            cur_on, cur_start = True, t
-        elif not good and cur_on:
-            cur_on = False
-            windows.append(SunWindow(start=cur_start, end=t))
-        t += step
-    if cur_on and cur_start:
-        windows.append(SunWindow(start=cur_start, end=end))
+    for i, j in zip(run_starts, run_stops):
+        w_start = start + timedelta(minutes=int(t[i]))
+        w_end = start + timedelta(minutes=int(t[j])) if j < len(t) else end
+        windows.append(SunWindow(start=w_start, end=w_end))
     return merge_adjacent(windows, step_minutes)
 
 
@@ -81,15 +169,61 @@ def merge_adjacent(windows: List[SunWindow], step_minutes: int) -> List[SunWindo
     return out
 
 
+def windows_to_epochs(windows: List[SunWindow]) -> List[List[int]]:
+    """[[start_ts, end_ts], ...] in unix seconds, the SunWindowCache format."""
+    return [[int(w.start.timestamp()), int(w.end.timestamp())] for w in windows]
+
+
+def day_window_epochs(task: tuple) -> tuple:
+    """
+    (spot_id, lat, lon, intervals, min_elevation, day) -> (spot_id, day, epochs).
+    Process-pool worker for precompute_windows; kept free of Django imports
+    so it also loads under the spawn/forkserver start methods.
+    """
+    spot_id, lat, lon, intervals, min_elevation, day = task
+    windows = sun_windows_for_day(
+        lat=lat,
+        lon=lon,
+        on_date=day,
+        azimuth_intervals=intervals,
+        min_elevation_deg=min_elevation,
+    )
+    return spot_id, day, windows_to_epochs(windows)
+
+
+def epochs_to_json(pairs: List[List[int]], tz) -> List[Dict[str, str]]:
+    """Render [[start_ts, end_ts], ...] as {start, end} ISO strings in tz."""
+    return [
+        {
+            "start": datetime.fromtimestamp(s, tz).isoformat(),
+            "end": datetime.fromtimestamp(e, tz).isoformat(),
+        }
+        for s, e in pairs
+    ]
+
+
 def intersect_with_allowed_hours(
-    windows: List[SunWindow], allowed: List[Tuple[datetime, datetime]]
-) -> List[SunWindow]:
-    """Intersect sun windows with allowed (weather-matching) time ranges."""
-    out: List[SunWindow] = []
-    for ws in windows:
-        for a_start, a_end in allowed:
-            s = max(ws.start, a_start)
-            e = min(ws.end, a_end)
-            if s < e:
-                out.append(SunWindow(s, e))
-    return merge_adjacent(out, MIN_STEP_MINUTES)
+    windows: List[List[int]], allowed: List[Tuple[int, int]]
+) -> List[List[int]]:
+    """
+    Intersect sun windows with allowed (weather-matching) time ranges,
+    both given as (start_ts, end_ts) unix seconds.
+    """
+    ws = np.asarray(windows, dtype=np.int64).reshape(-1, 2)
+    al = np.asarray(allowed, dtype=np.int64).reshape(-1, 2)
+    s = np.maximum(ws[:, None, 0], al[None, :, 0]).ravel()
+    e = np.minimum(ws[:, None, 1], al[None, :, 1]).ravel()
+    mask = s < e
+    s, e = s[mask], e[mask]
+    if not len(s):
+        return []
+
+    order = np.argsort(s, kind="stable")
+    tol = MIN_STEP_MINUTES * 60
+    out = [[int(s[order[0]]), int(e[order[0]])]]
+    for i in order[1:]:
+        if s[i] - out[-1][1] <= tol:
+            out[-1][1] = max(out[-1][1], int(e[i]))
+        else:
+            out.append([int(s[i]), int(e[i])])
+    return out
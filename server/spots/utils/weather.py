@@ -1,54 +1,558 @@
 from __future__ import annotations
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from functools import lru_cache
+import numpy as np
+import orjson
 import requests
-from datetime import date, datetime, timedelta
-from typing import Literal, Optional, List, Tuple
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+from typing import Any, Callable, Dict, Literal, Optional, List, Tuple
+
+logger = logging.getLogger(__name__)
 
 # Open-Meteo free API; uses WMO "weather_code".
 # Docs & features: open-meteo.com (no API key)
 # We'll use daily weather_code as a coarse filter.
 OPEN_METEO = "https://api.open-meteo.com/v1/forecast"
 
+# (connect, read): a stuck handshake fails fast instead of eating the read budget
+HTTP_TIMEOUT = (2, 8)
+
+# Shared keep-alive connection pool for all Open-Meteo calls
+_SESSION = requests.Session()
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=32,
+        max_retries=Retry(
+            total=2,
+            connect=2,
+            read=1,
+            backoff_factor=0.25,
+            status_forcelist=(429, 500, 502, 503, 504),
+            respect_retry_after_header=True,
+        ),
+    ),
+)
+# "gzip,deflate" plus "br" when brotli is installed (urllib3 decodes it then)
+_SESSION.headers["Accept-Encoding"] = ACCEPT_ENCODING
+
+# For independent lookups that can't share one request (different dates/tz)
+_POOL = ThreadPoolExecutor(max_workers=16, thread_name_prefix="open-meteo")
+# Stale-entry refreshes get their own workers: _POOL tasks may be waiting on
+# a key a queued refresh has claimed, so sharing one pool could deadlock
+_REFRESH_POOL = ThreadPoolExecutor(
+    max_workers=2, thread_name_prefix="open-meteo-refresh"
+)
+
+# Forecasts are refreshed upstream roughly hourly; serve repeats from memory.
+# Past the soft TTL an entry is still served, and refreshed in the background;
+# past the hard TTL callers wait for a fresh fetch.
+CACHE_SOFT_TTL_S = 20 * 60
+CACHE_HARD_TTL_S = 3 * 60 * 60
+CACHE_MAX_ENTRIES = 10_000
+# keeps the comma-separated coordinate lists well within URL limits
+MAX_COORDS_PER_REQUEST = 100
+# forecast models resolve ~0.05° (≈5 km); spots within one cell share a lookup
+GRID_STEP_DEG = 0.05
+
+_cache: Dict[tuple, Tuple[float, float, Any]] = {}  # key -> (soft, hard, value)
+_cache_lock = threading.Lock()
+_inflight: Dict[tuple, Future] = {}  # key -> pending fetch, shared by callers
+_MISS = object()
+# request params -> (expires, ETag, Last-Modified, series) for conditional
+# refetches; they live as long as the cache entries built from them, and all
+# share one TTL, so insertion order is expiry order
+_validators: Dict[
+    tuple, Tuple[float, Optional[str], Optional[str], List[dict]]
+] = {}
+
+
+@lru_cache(maxsize=None)
+def _disk_cache():
+    """
+    Optional second tier shared by all worker processes and kept across
+    restarts; enabled by settings.WEATHER_CACHE_DIR.
+    """
+    from django.conf import settings
+
+    path = getattr(settings, "WEATHER_CACHE_DIR", None)
+    if not path:
+        return None
+    from diskcache import Cache
+
+    return Cache(path, size_limit=200_000_000)
+
+
+def _cache_get(key: tuple) -> Tuple[Any, bool]:
+    """(value or _MISS, is_fresh)"""
+    with _cache_lock:
+        hit = _cache.get(key)
+    now = time.monotonic()
+    if hit is not None and now < hit[1]:
+        return hit[2], now < hit[0]
+
+    disk = _disk_cache()
+    if disk is None:
+        return _MISS, False
+    # on disk expiries are wall-clock, monotonic time isn't shared between processes
+    hit = disk.get(key)
+    wall = time.time()
+    if hit is None or wall >= hit[1]:
+        return _MISS, False
+    soft_at, hard_at, value = hit
+    with _cache_lock:
+        _cache[key] = (now + soft_at - wall, now + hard_at - wall, value)
+    return value, wall < soft_at
+
+
+def _cache_put(key: tuple, value: Any) -> None:
+    now = time.monotonic()
+    with _cache_lock:
+        if len(_cache) >= CACHE_MAX_ENTRIES:
+            for k in [k for k, (_, hard, _) in _cache.items() if hard <= now]:
+                del _cache[k]
+            if len(_cache) >= CACHE_MAX_ENTRIES:
+                _cache.clear()
+        _cache[key] = (now + CACHE_SOFT_TTL_S, now + CACHE_HARD_TTL_S, value)
+
+    disk = _disk_cache()
+    if disk is not None:
+        wall = time.time()
+        disk.set(
+            key,
+            (wall + CACHE_SOFT_TTL_S, wall + CACHE_HARD_TTL_S, value),
+            expire=CACHE_HARD_TTL_S,
+        )
+
+
+def _tz_param(tz: Optional[str]) -> str:
+    # None, "" and " auto " all mean the same request, keep one cache key for them
+    return (tz or "").strip() or "auto"
+
+
+def _grid(x: float, step: float = GRID_STEP_DEG) -> float:
+    return round(round(x / step) * step, 4)
+
+
+def grid_cell(lat: float, lon: float) -> Tuple[float, float]:
+    """The forecast grid point a location is looked up (and cached) at."""
+    return _grid(lat), _grid(lon)
+
+
+def _cache_key(
+    kind: str, lat: float, lon: float, start: date, end: date, tz
+) -> tuple:
+    return (
+        kind,
+        lat,
+        lon,
+        start.isoformat(),
+        end.isoformat(),
+        _tz_param(tz),
+    )
+
+
+def _daily_window(on_date: date) -> Tuple[date, date]:
+    """
+    The week (Mon..Sun) around on_date: daily lookups fetch and cache it
+    whole, so the other days of a multi-day view come from the same entry.
+    """
+    start = on_date - timedelta(days=on_date.weekday())
+    # forecasts only reach ~16 days ahead; don't let the week run past that
+    horizon = date.today() + timedelta(days=14)
+    return start, max(on_date, min(start + timedelta(days=6), horizon))
+
 
 # Map Open-Meteo WMO weather codes to our coarse categories.
 # See: "weather_code" follows WMO ww interpretations (28 conditions).
 # We'll collapse them into Sunny/Partly/Cloudy/Overcast/Rain/Snow.
+# WMO codes are 0..99, so this is a flat lookup table; "cloudy" is the fallback.
+_CODE_CAT = ["cloudy"] * 100
+_CODE_CAT[0] = "sunny"
+_CODE_CAT[1] = "mostly_clear"  # mostly clear
+_CODE_CAT[2] = "partly_cloudy"
+_CODE_CAT[3] = "cloudy"
+for _c in (45, 48):
+    _CODE_CAT[_c] = "overcast"
+for _c in (51, 53, 55, 56, 57, 61, 63, 65, 66, 67, 80, 81, 82, 95, 96, 99):
+    _CODE_CAT[_c] = "rain"
+for _c in (71, 73, 75, 77, 85, 86):
+    _CODE_CAT[_c] = "snow"
+_CODE_CAT = tuple(_CODE_CAT)
+
+
 def code_to_category(code: int) -> str:
-    if code == 0:
-        return "sunny"
-    if code in (1,):
-        return "mostly_clear"  # mostly clear
-    if code in (2,):
-        return "partly_cloudy"
-    if code in (3,):
-        return "cloudy"
-    if code in (45, 48):
-        return "overcast"
-    if code in (51, 53, 55, 56, 57, 61, 63, 65, 66, 67, 80, 81, 82, 95, 96, 99):
-        return "rain"
-    if code in (71, 73, 75, 77, 85, 86):
-        return "snow"
-    # default fallback
-    return "cloudy"
+    return _CODE_CAT[code] if 0 <= code < 100 else "cloudy"
+
+
+@lru_cache(maxsize=256)
+def _desired_mask(desired: frozenset) -> np.ndarray:
+    """
+    Boolean table: code -> category in desired. Index 100 stands in for
+    out-of-range codes (-> "cloudy"). Shared between calls, so read-only.
+    """
+    mask = np.array([cat in desired for cat in _CODE_CAT + ("cloudy",)])
+    mask.flags.writeable = False
+    return mask
+
+
+@lru_cache(maxsize=256)
+def _compiled_matcher(desired: frozenset) -> Callable[[np.ndarray], np.ndarray]:
+    """
+    ok-hour test specialized for one desired set, with its code table bound
+    in, so repeat calls skip the table lookup and the "no preference" branch.
+    """
+    if not desired:
+        return lambda codes: np.ones(len(codes), dtype=bool)
+    mask = _desired_mask(desired)
+
+    def match(codes: np.ndarray) -> np.ndarray:
+        return mask[np.where((codes >= 0) & (codes < 100), codes, 100)]
+
+    return match
+
+
+def _fetch_series(coords: List[Tuple[float, float]], params: dict) -> List[dict]:
+    """
+    One request for many locations; Open-Meteo returns one series per
+    coordinate, in input order (a bare object when there is only one).
+    """
+    out: List[dict] = []
+    for i in range(0, len(coords), MAX_COORDS_PER_REQUEST):
+        chunk = coords[i : i + MAX_COORDS_PER_REQUEST]
+        q = {
+            **params,
+            # 4 decimals (~10 m) is far below the forecast grid resolution
+            "latitude": ",".join(f"{lat:.4f}" for lat, _ in chunk),
+            "longitude": ",".join(f"{lon:.4f}" for _, lon in chunk),
+        }
+        out.extend(_get_conditional(q))
+    return out
+
+
+def _get_conditional(params: dict) -> List[dict]:
+    """
+    GET with If-None-Match/If-Modified-Since from the previous identical
+    request; a 304 reuses its series without downloading or parsing a body.
+    """
+    req_key = tuple(sorted(params.items()))
+    with _cache_lock:
+        prev = _validators.get(req_key)
+    if prev is not None and prev[0] <= time.monotonic():
+        prev = None
+    headers = {}
+    if prev is not None:
+        _, etag, last_modified, _ = prev
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+    r = _SESSION.get(OPEN_METEO, params=params, headers=headers, timeout=HTTP_TIMEOUT)
+    if r.status_code == 304 and prev is not None:
+        _, etag, last_modified, series = prev
+        _remember_validators(req_key, etag, last_modified, series)
+        return series
+    r.raise_for_status()
+    data = orjson.loads(r.content)
+    series = data if isinstance(data, list) else [data]
+    etag = r.headers.get("ETag")
+    last_modified = r.headers.get("Last-Modified")
+    if etag or last_modified:
+        _remember_validators(req_key, etag, last_modified, series)
+    return series
+
+
+def _remember_validators(
+    req_key: tuple,
+    etag: Optional[str],
+    last_modified: Optional[str],
+    series: List[dict],
+) -> None:
+    now = time.monotonic()
+    with _cache_lock:
+        _validators.pop(req_key, None)  # re-insert at the back
+        _validators[req_key] = (now + CACHE_HARD_TTL_S, etag, last_modified, series)
+        while _validators:
+            oldest = next(iter(_validators))
+            if _validators[oldest][0] > now and len(_validators) <= CACHE_MAX_ENTRIES:
+                break
+            del _validators[oldest]
+
+
+def _batched(
+    kind: str,
+    coords: List[Tuple[float, float]],
+    start: date,
+    end: date,
+    tz: Optional[str],
+    params: dict,
+    parse: Callable[[dict], Any],
+) -> List[Any]:
+    """
+    Serve coords from the cache, fetch all misses in one request and
+    refresh stale entries in the background.
+    """
+    # snapped coords are both the cache key and what gets requested
+    coords = [grid_cell(lat, lon) for lat, lon in coords]
+    keys = [_cache_key(kind, lat, lon, start, end, tz) for lat, lon in coords]
+    params = {
+        **params,
+        "timezone": _tz_param(tz),
+        "timeformat": "unixtime",
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+    }
+    out: List[Any] = []
+    missing: List[int] = []
+    stale: List[int] = []
+    for i, key in enumerate(keys):
+        value, fresh = _cache_get(key)
+        out.append(value)
+        if value is _MISS:
+            missing.append(i)
+        elif not fresh:
+            stale.append(i)
+
+    if stale:
+        mine, futures = _claim({keys[i]: coords[i] for i in stale})
+        if mine:
+            _REFRESH_POOL.submit(_refresh, mine, futures, params, parse)
+    if missing:
+        mine, futures = _claim({keys[i]: coords[i] for i in missing})
+        if mine:
+            _fetch_claimed(mine, futures, params, parse)
+        for i in missing:
+            out[i] = futures[keys[i]].result()
+    return out
+
+
+def _claim(
+    todo: Dict[tuple, Tuple[float, float]],
+) -> Tuple[Dict[tuple, Tuple[float, float]], Dict[tuple, Future]]:
+    """
+    Singleflight: returns the keys this caller has to fetch itself, and a
+    future per key which concurrent callers of the same key wait on.
+    """
+    mine = {}
+    futures = {}
+    with _cache_lock:
+        for key, coord in todo.items():
+            fut = _inflight.get(key)
+            if fut is None:
+                fut = _inflight[key] = Future()
+                mine[key] = coord
+            futures[key] = fut
+    return mine, futures
+
+
+def _fetch_claimed(
+    mine: Dict[tuple, Tuple[float, float]],
+    futures: Dict[tuple, Future],
+    params: dict,
+    parse: Callable[[dict], Any],
+) -> None:
+    error: Optional[BaseException] = None
+    try:
+        series = _fetch_series(list(mine.values()), params)
+        for key, j in zip(mine, series):
+            value = parse(j)
+            _cache_put(key, value)
+            futures[key].set_result(value)
+    except BaseException as exc:
+        error = exc
+        raise
+    finally:
+        with _cache_lock:
+            for key in mine:
+                _inflight.pop(key, None)
+        for key in mine:
+            if not futures[key].done():
+                futures[key].set_exception(
+                    error or RuntimeError("Open-Meteo returned no series")
+                )
+
+
+def _refresh(
+    mine: Dict[tuple, Tuple[float, float]],
+    futures: Dict[tuple, Future],
+    params: dict,
+    parse: Callable[[dict], Any],
+) -> None:
+    try:
+        _fetch_claimed(mine, futures, params, parse)
+    except Exception:
+        logger.warning("Background weather refresh failed", exc_info=True)
+
+
+def _parse_daily(j: dict) -> Dict[date, str]:
+    # unixtime daily stamps are local midnights; shift by the offset to get the day
+    daily = j.get("daily", {})
+    offset = j.get("utc_offset_seconds") or 0
+    return {
+        datetime.fromtimestamp(t + offset, timezone.utc).date(): code_to_category(
+            int(c)
+        )
+        for t, c in zip(daily.get("time") or [], daily.get("weathercode") or [])
+        if c is not None
+    }
+
+
+def _parse_day(j: dict) -> Tuple[List[int], List[int], Optional[str]]:
+    """(times, codes, daily category) from an hourly+daily response."""
+    times = j.get("hourly", {}).get("time") or []
+    codes = j.get("hourly", {}).get("weathercode") or []
+    daily = j.get("daily", {}).get("weathercode") or []
+    if daily and daily[0] is not None:
+        return times, codes, code_to_category(int(daily[0]))
+    # no daily code in the response: fall back to the most common hourly category
+    common = Counter(
+        code_to_category(int(c)) for c in codes if c is not None
+    ).most_common(1)
+    return times, codes, common[0][0] if common else None
+
+
+def daily_weather_categories(
+    coords: List[Tuple[float, float]], on_date: date, tz: Optional[str] = None
+) -> List[Optional[str]]:
+    """Daily category per (lat, lon), in input order."""
+    out: List[Optional[str]] = [None] * len(coords)
+    todo: List[int] = []
+    for i, (lat, lon) in enumerate(coords):
+        # an hourly lookup of the same day already carries the daily code
+        key = _cache_key("day", *grid_cell(lat, lon), on_date, on_date, tz)
+        day, _ = _cache_get(key)
+        if day is _MISS:
+            todo.append(i)
+        else:
+            out[i] = day[2]
+    if todo:
+        start, end = _daily_window(on_date)
+        weeks = _batched(
+            "daily",
+            [coords[i] for i in todo],
+            start,
+            end,
+            tz,
+            {"daily": "weathercode"},
+            _parse_daily,
+        )
+        for i, days in zip(todo, weeks):
+            out[i] = days.get(on_date)
+    return out
 
 
 def daily_weather_category(
     lat: float, lon: float, on_date: date, tz: Optional[str] = None
 ) -> Optional[str]:
-    params = {
-        "latitude": lat,
-        "longitude": lon,
-        "daily": "weathercode",
-        "timezone": tz or "auto",
-        "start_date": on_date.isoformat(),
-        "end_date": on_date.isoformat(),
-    }
-    r = requests.get(OPEN_METEO, params=params, timeout=10)
-    r.raise_for_status()
-    data = r.json()
-    codes = data.get("daily", {}).get("weathercode") or []
-    if not codes:
-        return None
-    return code_to_category(int(codes[0]))
+    return daily_weather_categories([(lat, lon)], on_date, tz)[0]
+
+
+def daily_weather_categories_range(
+    lat: float, lon: float, start: date, end: date, tz: Optional[str] = None
+) -> Dict[date, str]:
+    """Daily category per date from start to end (inclusive), in one request."""
+    days = _batched(
+        "daily",
+        [(lat, lon)],
+        start,
+        end,
+        tz,
+        {"daily": "weathercode"},
+        _parse_daily,
+    )[0]
+    return dict(days)
+
+
+def _days_batch(
+    coords: List[Tuple[float, float]],
+    on_date: date,
+    tzname: str | None,
+) -> List[Tuple[List[int], List[int], Optional[str]]]:
+    # hourly and daily codes in one request: the daily code is a few bytes
+    # more and saves a second call wherever both are needed
+    return _batched(
+        "day",
+        coords,
+        on_date,
+        on_date,
+        tzname,
+        {"hourly": "weathercode", "daily": "weathercode"},
+        _parse_day,
+    )
+
+
+def hourly_weathercodes_batch(
+    coords: List[Tuple[float, float]],
+    on_date: date,
+    tzname: str | None = "auto",
+) -> List[Tuple[List[int], List[int]]]:
+    """(times, codes) per (lat, lon), in input order."""
+    return [(times, codes) for times, codes, _ in _days_batch(coords, on_date, tzname)]
+
+
+def hourly_weathercodes(
+    lat: float,
+    lon: float,
+    on_date: date,
+    tzname: str | None = "auto",
+) -> Tuple[List[int], List[int]]:
+    """
+    Returns (times, codes): hourly unix timestamps and WMO weather codes
+    for the given date (a local day in tzname).
+    """
+    return hourly_weathercodes_batch([(lat, lon)], on_date, tzname)[0]
+
+
+def allowed_ranges_from_codes(
+    times: List[int], codes: List[int], desired: set[str]
+) -> List[Tuple[int, int]]:
+    """
+    Returns a list of (start,end) unix timestamps where the hourly weather
+    code category is in 'desired'.
+    """
+    if not times or not codes:
+        return []
+
+    n = min(len(times), len(codes))
+    # null codes (near the forecast horizon) are out of range, i.e. "cloudy"
+    codes_arr = np.array([-1 if c is None else c for c in codes[:n]], dtype=np.int16)
+    ok = _compiled_matcher(frozenset(desired or ()))(codes_arr)
+
+    # runs of ok hours: +1 at a run start, -1 one past its end
+    edges = np.diff(np.concatenate(([0], ok.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    out: List[Tuple[int, int]] = []
+    for i, j in zip(starts, ends):
+        # the last run extends to the end of the last hour
+        end = times[j] if j < n else times[n - 1] + 3600
+        out.append((int(times[i]), int(end)))
+    return out
+
+
+@lru_cache(maxsize=None)
+def _zone(name: str | None):
+    return ZoneInfo(name) if name and name != "auto" else timezone.utc
+
+
+def _as_datetimes(
+    ranges: List[Tuple[int, int]], tzname: str | None
+) -> List[Tuple[datetime, datetime]]:
+    tz = _zone(tzname)
+    return [
+        (datetime.fromtimestamp(s, tz), datetime.fromtimestamp(e, tz))
+        for s, e in ranges
+    ]
 
 
 def hourly_allowed_ranges(
@@ -59,38 +563,50 @@ def hourly_allowed_ranges(
     tzname: str | None = "auto",
 ) -> List[Tuple[datetime, datetime]]:
     """
-    Returns a list of (start,end) datetimes within the given date where
-    the hourly weather code category is in 'desired'.
+    Returns a list of (start,end) aware datetimes within the given date where
+    the hourly weather code category is in 'desired' (in tzname, UTC for auto).
     """
-    params = {
-        "latitude": lat,
-        "longitude": lon,
-        "hourly": "weathercode",
-        "timezone": tzname or "auto",
-        "start_date": on_date.isoformat(),
-        "end_date": on_date.isoformat(),
-    }
-    r = requests.get(OPEN_METEO, params=params, timeout=10)
-    r.raise_for_status()
-    j = r.json()
-    times = j.get("hourly", {}).get("time") or []
-    codes = j.get("hourly", {}).get("weathercode") or []
-    if not times or not codes:
-        return []
+    times, codes = hourly_weathercodes(lat, lon, on_date, tzname)
+    return _as_datetimes(allowed_ranges_from_codes(times, codes, desired), tzname)
 
-    out: List[Tuple[datetime, datetime]] = []
-    cur_start = None
-    for i, ts in enumerate(times):
-        dt = datetime.fromisoformat(ts)
-        cat = code_to_category(int(codes[i]))
-        ok = (not desired) or (cat in desired)
-        if ok and cur_start is None:
-            cur_start = dt
-        elif not ok and cur_start is not None:
-            out.append((cur_start, dt))
-            cur_start = None
-    if cur_start is not None:
-        # extend to the end of day hour
-        last_dt = datetime.fromisoformat(times[-1]) + timedelta(hours=1)
-        out.append((cur_start, last_dt))
+
+def fetch_day(
+    lat: float,
+    lon: float,
+    on_date: date,
+    desired: set[str],
+    tzname: str | None = "auto",
+) -> Tuple[Optional[str], List[Tuple[datetime, datetime]]]:
+    """
+    (daily category, hourly_allowed_ranges) for one location/date from a
+    single request.
+    """
+    times, codes, day = _days_batch([(lat, lon)], on_date, tzname)[0]
+    ranges = _as_datetimes(allowed_ranges_from_codes(times, codes, desired), tzname)
+    return day, ranges
+
+
+def hourly_allowed_ranges_batch(
+    coords: List[Tuple[float, float]],
+    on_date: date,
+    desired: set[str],
+    tzname: str | None = "auto",
+) -> List[List[Tuple[datetime, datetime]]]:
+    """hourly_allowed_ranges for many locations with a single request."""
+    return [
+        _as_datetimes(allowed_ranges_from_codes(times, codes, desired), tzname)
+        for times, codes in hourly_weathercodes_batch(coords, on_date, tzname)
+    ]
+
+
+def fetch_many(calls: List[Tuple[Callable[..., Any], tuple]]) -> List[Any]:
+    """
+    Run independent weather lookups concurrently, e.g.
+    fetch_many([(hourly_weathercodes, (lat, lon, d)) for d in days]).
+    Results are returned in input order; the first error is re-raised.
+    """
+    futures = {_POOL.submit(fn, *args): i for i, (fn, args) in enumerate(calls)}
+    out: List[Any] = [None] * len(calls)
+    for fut in as_completed(futures):
+        out[futures[fut]] = fut.result()
     return out